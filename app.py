@@ -3,6 +3,7 @@ Streamlit Tidsapp – Homebase/Deputy-liknande MVP
 ================================================
 
 Körning lokalt:
+  pip install streamlit pandas passlib argon2-cffi
   streamlit run streamlit_tidsapp.py
 
 Feature-översikt (MVP):
@@ -27,20 +28,67 @@ import sqlite3
 from dataclasses import dataclass
 from datetime import datetime, date, time, timedelta
 import hashlib
+import hmac
+from contextlib import contextmanager
+from passlib.hash import argon2
 from typing import Optional, List, Tuple
 
 DB_PATH = "tidsapp.db"
+# Tidsstämplar lagras som ISO-8601 – tolkas direkt vid inläsning
+PUNCH_PARSE_DATES = {"clock_in": {"format": "ISO8601"}, "clock_out": {"format": "ISO8601"}}
+
+# Frekventa frågor som konstanter – identisk text ger träff i sqlite3:s statement-cache
+SQL_GET_USER = "SELECT id, username, full_name, password_hash, role, hourly_rate, pin FROM users WHERE username=?"
+SQL_GET_USER_BY_PIN = "SELECT id, username, full_name, role FROM users WHERE pin=?"
+SQL_COUNT_USERS = "SELECT COUNT(*) FROM users"
+SQL_OPEN_PUNCH = "SELECT id, clock_in FROM punches WHERE user_id=? AND clock_out IS NULL ORDER BY id DESC LIMIT 1"
+SQL_TODAY_PUNCHES = "SELECT p.id, p.clock_in, p.clock_out, p.note, p.location, p.out_note, p.out_location, p.approved FROM punches p WHERE p.user_id=? AND p.clock_in >= ? AND p.clock_in < ? ORDER BY p.clock_in DESC"
+SQL_WEEK_SHIFTS = "SELECT s.id, u.full_name, s.shift_date, s.start_time, s.end_time, s.position, s.location FROM shifts s LEFT JOIN users u ON s.user_id=u.id WHERE s.shift_date >= ? AND s.shift_date <= ? ORDER BY s.shift_date, s.start_time"
 
 # ------------------------------
 # Hjälpfunktioner
 # ------------------------------
 
 def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-
-def init_db():
-    with get_conn() as conn:
+    """En anslutning per session – återanvänds mellan omkörningar men delas inte med andra sessioner."""
+    conn = st.session_state.get("_db_conn")
+    if conn is None:
+        conn = _connect()
+        st.session_state["_db_conn"] = conn
+    return conn
+
+
+def _connect():
+    # isolation_level=None: autocommit – transaktioner öppnas bara explicit via write_tx
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    # WAL är beständigt i databasfilen (ej möjligt för :memory:)
+    if DB_PATH != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+    # Anslutningsspecifika PRAGMAs – sätts en gång när anslutningen skapas
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    init_db(conn)
+    return conn
+
+
+@contextmanager
+def write_tx(conn):
+    """Skrivtransaktion som tar databasens skrivlås direkt (BEGIN IMMEDIATE) i stället för att uppgradera mitt i."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def init_db(conn):
+    """Schema, migreringar och index – körs en gång när sessionens anslutning skapas."""
+    with write_tx(conn):
         cur = conn.cursor()
         # Users
         cur.execute(
@@ -66,6 +114,8 @@ def init_db():
                 clock_out TEXT,
                 note TEXT,
                 location TEXT,
+                out_note TEXT,
+                out_location TEXT,
                 approved INTEGER DEFAULT 0,
                 FOREIGN KEY(user_id) REFERENCES users(id)
             )
@@ -86,55 +136,113 @@ def init_db():
             )
             """
         )
-        conn.commit()
+        # Migrering: äldre databaser saknar kolumner för anteckning/plats vid utstämpling
+        punch_cols = {r[1] for r in cur.execute("PRAGMA table_info(punches)")}
+        for col in ("out_note", "out_location"):
+            if col not in punch_cols:
+                cur.execute(f"ALTER TABLE punches ADD COLUMN {col} TEXT")
+        # Index för vanliga uppslag (öppen stämpling, datumintervall, veckoschema)
+        # Partiellt index: bara pågående pass (clock_out IS NULL) – ersätter idx_punches_user_open
+        cur.execute("DROP INDEX IF EXISTS idx_punches_user_open")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_punches_open ON punches(user_id) WHERE clock_out IS NULL")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_punches_clockin ON punches(clock_in)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts(shift_date, start_time)")
+
+
+def _sha256_hex(pw: str) -> str:
+    # hashlib.sha256 är OpenSSL-backad i CPython (SHA-NI där CPU:n stödjer det)
+    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
 
 
 def hash_pw(pw: str) -> str:
-    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
+    """Saltad argon2-hash. Lösenordet förhashas med SHA-256 så att verifieringen kan cachas utan klartext."""
+    return argon2.hash(_sha256_hex(pw))
+
+
+def _is_legacy_hash(stored: str) -> bool:
+    # Äldre databaser: osaltad SHA-256 som 64 hex-tecken
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _verify_digest(digest: str, stored: str) -> bool:
+    # Nyckel inkluderar lagrad hash – byte av lösenord ger automatiskt en ny cachepost
+    if _is_legacy_hash(stored):
+        return hmac.compare_digest(digest, stored)
+    try:
+        return argon2.verify(digest, stored)
+    except ValueError:
+        return False
+
+
+def verify_pw(user: sqlite3.Row, pw: str) -> bool:
+    """Verifierar lösenord och uppgraderar gamla SHA-256-hashar till argon2 vid lyckad inloggning."""
+    stored = user["password_hash"]
+    if not _verify_digest(_sha256_hex(pw), stored):
+        return False
+    if _is_legacy_hash(stored):
+        new_hash = hash_pw(pw)
+        conn = get_conn()
+        with write_tx(conn):
+            conn.execute("UPDATE users SET password_hash=? WHERE id=?", (new_hash, user["id"]))
+    return True
 
 
 def get_user_by_username(username: str):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, full_name, password_hash, role, hourly_rate, pin FROM users WHERE username=?", (username,))
-        row = cur.fetchone()
-        if row:
-            keys = ["id","username","full_name","password_hash","role","hourly_rate","pin"]
-            return dict(zip(keys, row))
-        return None
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(SQL_GET_USER, (username,))
+    # sqlite3.Row ger uppslag via kolumnnamn utan att bygga en dict
+    return cur.fetchone()
 
 
 def get_user_by_pin(pin: str):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, full_name, role FROM users WHERE pin=?", (pin,))
-        row = cur.fetchone()
-        if row:
-            keys = ["id","username","full_name","role"]
-            return dict(zip(keys, row))
-        return None
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(SQL_GET_USER_BY_PIN, (pin,))
+    return cur.fetchone()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_users_df():
+    """Personallistan ändras sällan – cachas så att varje omkörning slipper läsa om den."""
+    return pd.read_sql_query("SELECT id, username, full_name, role, hourly_rate, pin FROM users ORDER BY full_name", get_conn())
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_user_names():
+    # id -> namn för val av medarbetare (namn är inte unika); ingen DataFrame behövs
+    return dict(get_conn().execute("SELECT id, full_name FROM users ORDER BY full_name").fetchall())
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_week_shifts(week_start: str, week_end: str):
+    return pd.read_sql_query(
+        SQL_WEEK_SHIFTS,
+        get_conn(),
+        params=(week_start, week_end),
+    )
 
 
 def ensure_seed_admin():
     """Skapar en första admin om databasen saknar användare."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM users")
-        (count,) = cur.fetchone()
+    conn = get_conn()
+    (count,) = conn.execute(SQL_COUNT_USERS).fetchone()
+    if count:
+        return
+    seed = [
+        ("admin", "System Admin", hash_pw("admin123"), "Admin", 0, "0000"),
+        ("anna", "Anna Andersson", hash_pw("chef123"), "Manager", 165, "1111"),
+        ("erik", "Erik Ek", hash_pw("server123"), "Employee", 145, "2222"),
+    ]
+    with write_tx(conn):
+        # Kontrollera igen under skrivlåset – en annan session kan ha hunnit seeda
+        (count,) = conn.execute(SQL_COUNT_USERS).fetchone()
         if count == 0:
-            cur.execute(
+            conn.executemany(
                 "INSERT INTO users (username, full_name, password_hash, role, hourly_rate, pin) VALUES (?,?,?,?,?,?)",
-                ("admin", "System Admin", hash_pw("admin123"), "Admin", 0, "0000"),
+                seed,
             )
-            cur.execute(
-                "INSERT INTO users (username, full_name, password_hash, role, hourly_rate, pin) VALUES (?,?,?,?,?,?)",
-                ("anna", "Anna Andersson", hash_pw("chef123"), "Manager", 165, "1111"),
-            )
-            cur.execute(
-                "INSERT INTO users (username, full_name, password_hash, role, hourly_rate, pin) VALUES (?,?,?,?,?,?)",
-                ("erik", "Erik Ek", hash_pw("server123"), "Employee", 145, "2222"),
-            )
-            conn.commit()
 
 
 # ------------------------------
@@ -149,7 +257,7 @@ def login_ui():
         password = st.text_input("Lösenord", type="password")
         if st.button("Logga in", type="primary"):
             user = get_user_by_username(username)
-            if user and user["password_hash"] == hash_pw(password):
+            if user and verify_pw(user, password):
                 st.session_state["user"] = {k: user[k] for k in ("id","username","full_name","role","hourly_rate")}
                 st.success(f"Välkommen {user['full_name']}!")
                 st.rerun()
@@ -186,37 +294,34 @@ def clock_view():
     location = st.text_input("Plats (valfritt)", placeholder="Bar, Kök, Matsal ...")
 
     # Hämta pågående stämpling
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, clock_in FROM punches WHERE user_id=? AND clock_out IS NULL ORDER BY id DESC LIMIT 1",
-            (user["id"],),
-        )
-        active = cur.fetchone()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(SQL_OPEN_PUNCH, (user["id"],))
+    active = cur.fetchone()
 
     if active:
         punch_id, clock_in_str = active
         clock_in_dt = datetime.fromisoformat(clock_in_str)
         st.info(f"Pågående pass sedan {clock_in_dt.strftime('%Y-%m-%d %H:%M')}")
         if st.button("Stämpla UT", type="primary"):
-            with get_conn() as conn:
+            with write_tx(conn):
                 cur = conn.cursor()
                 cur.execute(
-                    "UPDATE punches SET clock_out=?, note=COALESCE(note,'' ) || ?, location=COALESCE(location,'') || ? WHERE id=?",
-                    (datetime.now().isoformat(), f"\n{note}" if note else "", f"\n{location}" if location else "", punch_id),
+                    "UPDATE punches SET clock_out=?, out_note=?, out_location=? WHERE id=?",
+                    (datetime.now().isoformat(), note or None, location or None, punch_id),
                 )
-                conn.commit()
+            compute_report.clear()
             st.success("Utstämpling registrerad.")
             st.rerun()
     else:
         if st.button("Stämpla IN", type="primary"):
-            with get_conn() as conn:
+            with write_tx(conn):
                 cur = conn.cursor()
                 cur.execute(
                     "INSERT INTO punches (user_id, clock_in, note, location) VALUES (?,?,?,?)",
                     (user["id"], datetime.now().isoformat(), note, location),
                 )
-                conn.commit()
+            compute_report.clear()
             st.success("Instämpling registrerad.")
             st.rerun()
 
@@ -225,15 +330,15 @@ def clock_view():
     today = date.today()
     day_start = datetime.combine(today, time(0,0))
     day_end = day_start + timedelta(days=1)
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            "SELECT p.id, p.clock_in, p.clock_out, p.note, p.location, p.approved FROM punches p WHERE p.user_id=? AND datetime(p.clock_in) >= ? AND datetime(p.clock_in) < ? ORDER BY p.clock_in DESC",
-            conn,
-            params=(user["id"], day_start.isoformat(), day_end.isoformat()),
-        )
+    df = pd.read_sql_query(
+        SQL_TODAY_PUNCHES,
+        conn,
+        params=(user["id"], day_start.isoformat(), day_end.isoformat()),
+        parse_dates=PUNCH_PARSE_DATES,
+    )
     if not df.empty:
-        df["clock_in"] = pd.to_datetime(df["clock_in"]).dt.strftime("%Y-%m-%d %H:%M")
-        df["clock_out"] = df["clock_out"].apply(lambda x: pd.to_datetime(x).strftime("%Y-%m-%d %H:%M") if x else "—")
+        df["clock_in"] = df["clock_in"].dt.strftime("%Y-%m-%d %H:%M")
+        df["clock_out"] = df["clock_out"].dt.strftime("%Y-%m-%d %H:%M").fillna("—")
         st.dataframe(df, use_container_width=True)
     else:
         st.caption("Inga stämplingar ännu idag.")
@@ -255,13 +360,13 @@ def schedule_view():
     start_of_week = base - timedelta(days=base.weekday())
     days = [start_of_week + timedelta(days=i) for i in range(7)]
 
-    with get_conn() as conn:
-        users_df = pd.read_sql_query("SELECT id, full_name, role FROM users ORDER BY full_name", conn)
+    conn = get_conn()
+    user_names = _load_user_names()
 
     with st.expander("➕ Lägg till skift"):
         col1, col2 = st.columns(2)
         with col1:
-            person = st.selectbox("Medarbetare", users_df["full_name"].tolist())
+            uid = st.selectbox("Medarbetare", list(user_names), format_func=user_names.get)
             position = st.text_input("Position", placeholder="Server, Kök, Bar ...")
             loc = st.text_input("Plats", placeholder="Matsal, Bar ...")
         with col2:
@@ -269,24 +374,18 @@ def schedule_view():
             start_t = st.time_input("Start", time(10,0))
             end_t = st.time_input("Slut", time(18,0))
         if st.button("Spara skift"):
-            with get_conn() as conn:
+            with write_tx(conn):
                 cur = conn.cursor()
-                uid = int(users_df.loc[users_df["full_name"]==person, "id"].iloc[0])
                 cur.execute(
                     "INSERT INTO shifts (user_id, shift_date, start_time, end_time, position, location) VALUES (?,?,?,?,?,?)",
                     (uid, day.isoformat(), start_t.strftime("%H:%M"), end_t.strftime("%H:%M"), position, loc),
                 )
-                conn.commit()
+            _load_week_shifts.clear()
             st.success("Skift sparat.")
             st.rerun()
 
     # Visa vecka
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            "SELECT s.id, u.full_name, s.shift_date, s.start_time, s.end_time, s.position, s.location FROM shifts s LEFT JOIN users u ON s.user_id=u.id WHERE date(s.shift_date) >= ? AND date(s.shift_date) <= ? ORDER BY s.shift_date, s.start_time",
-            conn,
-            params=(days[0].isoformat(), days[-1].isoformat()),
-        )
+    df = _load_week_shifts(days[0].isoformat(), days[-1].isoformat())
     if df.empty:
         st.caption("Inga skift inlagda för vald vecka.")
     else:
@@ -297,10 +396,11 @@ def schedule_view():
         with st.expander("🗑️ Ta bort skift"):
             sel = st.multiselect("Välj skift-ID", df["id"].astype(str).tolist())
             if st.button("Radera valda") and sel:
-                with get_conn() as conn:
+                with write_tx(conn):
                     cur = conn.cursor()
-                    cur.executemany("DELETE FROM shifts WHERE id=?", [(int(x),) for x in sel])
-                    conn.commit()
+                    placeholders = ",".join("?"*len(sel))
+                    cur.execute(f"DELETE FROM shifts WHERE id IN ({placeholders})", [int(x) for x in sel])
+                _load_week_shifts.clear()
                 st.success("Raderat.")
                 st.rerun()
 
@@ -316,8 +416,8 @@ def staff_view():
         st.warning("Behörighet krävs (Admin).")
         return
 
-    with get_conn() as conn:
-        df = pd.read_sql_query("SELECT id, username, full_name, role, hourly_rate, pin FROM users ORDER BY full_name", conn)
+    conn = get_conn()
+    df = _load_users_df()
     st.dataframe(df, use_container_width=True)
 
     with st.expander("➕ Lägg till/uppdatera person"):
@@ -333,26 +433,33 @@ def staff_view():
         with col3:
             pw = st.text_input("Lösenord", type="password")
             if st.button("Spara person", type="primary"):
-                with get_conn() as conn:
+                # argon2 är avsiktligt långsam – hasha innan skrivlåset tas
+                new_hash = hash_pw(pw or "changeme") if (mode == "Ny" or pw) else None
+                with write_tx(conn):
                     cur = conn.cursor()
                     if mode == "Ny":
                         cur.execute(
                             "INSERT INTO users (username, full_name, password_hash, role, hourly_rate, pin) VALUES (?,?,?,?,?,?)",
-                            (username, full_name, hash_pw(pw or "changeme"), role, float(hourly), pin or None),
+                            (username, full_name, new_hash, role, float(hourly), pin or None),
                         )
                     else:
                         # Uppdatera – lösenord uppdateras om angivet
                         if pw:
                             cur.execute(
                                 "UPDATE users SET full_name=?, role=?, hourly_rate=?, pin=?, password_hash=? WHERE username=?",
-                                (full_name, role, float(hourly), pin or None, hash_pw(pw), username),
+                                (full_name, role, float(hourly), pin or None, new_hash, username),
                             )
                         else:
                             cur.execute(
                                 "UPDATE users SET full_name=?, role=?, hourly_rate=?, pin=? WHERE username=?",
                                 (full_name, role, float(hourly), pin or None, username),
                             )
-                    conn.commit()
+                # Namn och timlön visas även i väljaren, schemat och rapporten – rensa personallistan,
+                # namnväljaren, veckans skift och rapportcachen
+                _load_users_df.clear()
+                _load_user_names.clear()
+                compute_report.clear()
+                _load_week_shifts.clear()
                 st.success("Sparat.")
                 st.rerun()
 
@@ -370,35 +477,32 @@ def approvals_view():
 
     start = st.date_input("Från", value=date.today()-timedelta(days=7))
     end = st.date_input("Till", value=date.today())
-
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT p.id, u.full_name, p.clock_in, p.clock_out, p.note, p.location, p.approved
-            FROM punches p
-            LEFT JOIN users u ON p.user_id=u.id
-            WHERE datetime(p.clock_in) >= ? AND datetime(p.clock_in) < datetime(?,'+1 day')
-            ORDER BY p.clock_in DESC
-            """,
-            conn,
-            params=(datetime.combine(start, time.min).isoformat(), end.isoformat()),
-        )
+    # Halvöppet intervall [start, end+1 dag) – ISO-8601-text sorteras kronologiskt
+    start_iso = datetime.combine(start, time.min).isoformat()
+    end_iso = datetime.combine(end + timedelta(days=1), time.min).isoformat()
+
+    conn = get_conn()
+    df = pd.read_sql_query(
+        """
+        SELECT p.id, u.full_name, p.clock_in, p.clock_out, p.note, p.location, p.out_note, p.out_location, p.approved
+        FROM punches p
+        LEFT JOIN users u ON p.user_id=u.id
+        WHERE p.clock_in >= ? AND p.clock_in < ?
+        ORDER BY p.clock_in DESC
+        """,
+        conn,
+        params=(start_iso, end_iso),
+        parse_dates=PUNCH_PARSE_DATES,
+    )
     if df.empty:
         st.caption("Inga tider i intervallet.")
         return
 
-    # Beräkna timmar och enkel övertid
-    def duration_hours(row):
-        if pd.isna(row["clock_out"]) or not row["clock_out"]:
-            return 0.0
-        start_dt = pd.to_datetime(row["clock_in"]) ; end_dt = pd.to_datetime(row["clock_out"]) 
-        return (end_dt - start_dt).total_seconds()/3600
-
-    df["clock_in"] = pd.to_datetime(df["clock_in"])
-    df["clock_out"] = pd.to_datetime(df["clock_out"]) 
-    df["Timmar"] = df.apply(duration_hours, axis=1).round(2)
+    # Beräkna timmar (pågående pass utan UT räknas som 0)
+    delta = df["clock_out"].sub(df["clock_in"]).dt.total_seconds()
+    df["Timmar"] = (delta/3600).fillna(0).round(2)
 
-    st.dataframe(df[["id","full_name","clock_in","clock_out","Timmar","note","location","approved"]], use_container_width=True)
+    st.dataframe(df[["id","full_name","clock_in","clock_out","Timmar","note","location","out_note","out_location","approved"]], use_container_width=True)
 
     with st.expander("✏️ Justera/uppdatera"):
         sel_id = st.text_input("Rad-ID att uppdatera")
@@ -407,14 +511,14 @@ def approvals_view():
         approve = st.checkbox("Godkänn")
         if st.button("Spara ändring") and sel_id:
             try:
-                with get_conn() as conn:
+                with write_tx(conn):
                     cur = conn.cursor()
                     if new_in:
                         cur.execute("UPDATE punches SET clock_in=? WHERE id=?", (pd.to_datetime(new_in).isoformat(), int(sel_id)))
                     if new_out:
                         cur.execute("UPDATE punches SET clock_out=? WHERE id=?", (pd.to_datetime(new_out).isoformat(), int(sel_id)))
                     cur.execute("UPDATE punches SET approved=? WHERE id=?", (1 if approve else 0, int(sel_id)))
-                    conn.commit()
+                compute_report.clear()
                 st.success("Uppdaterat.")
                 st.rerun()
             except Exception as e:
@@ -425,43 +529,57 @@ def approvals_view():
 # Rapporter & export
 # ------------------------------
 
+@st.cache_data(ttl=60, show_spinner=False)
+def compute_report(start: date, end: date):
+    """Dagssummering och CSV för intervallet – cachas så att övriga widgetinteraktioner inte räknar om."""
+    # Halvöppet intervall [start, end+1 dag) – ISO-8601-text sorteras kronologiskt
+    start_iso = datetime.combine(start, time.min).isoformat()
+    end_iso = datetime.combine(end + timedelta(days=1), time.min).isoformat()
+
+    # Summera timmar per person och dag direkt i SQLite (pågående pass utan UT ger NULL och hoppas över)
+    daily = pd.read_sql_query(
+        """
+        SELECT u.full_name,
+               date(p.clock_in) AS date,
+               SUM((julianday(p.clock_out) - julianday(p.clock_in)) * 24) AS hours,
+               MAX(u.hourly_rate) AS hourly_rate
+        FROM punches p
+        JOIN users u ON p.user_id=u.id
+        WHERE p.clock_in >= ? AND p.clock_in < ?
+        GROUP BY u.id, date(p.clock_in)
+        ORDER BY u.full_name, date
+        """,
+        get_conn(),
+        params=(start_iso, end_iso),
+    )
+    if daily.empty:
+        return daily, b""
+
+    daily["hours"] = daily["hours"].fillna(0).round(2)
+
+    # Enkel övertidsregel: >8h på en dag => 50% OT på överskjutande
+    daily["ot_hours"] = (daily["hours"] - 8).clip(lower=0)
+    daily["reg_hours"] = daily["hours"] - daily["ot_hours"]
+    daily["pay"] = daily["reg_hours"]*daily["hourly_rate"] + daily["ot_hours"]*daily["hourly_rate"]*1.5
+
+    csv = daily.to_csv(index=False).encode("utf-8")
+    return daily, csv
+
+
 def reports_view():
     st.header("📊 Rapporter & Export")
     start = st.date_input("Från datum", value=date.today()-timedelta(days=14))
     end = st.date_input("Till datum", value=date.today())
 
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT p.id, u.full_name, u.hourly_rate, p.clock_in, p.clock_out, p.approved
-            FROM punches p
-            LEFT JOIN users u ON p.user_id=u.id
-            WHERE datetime(p.clock_in) >= ? AND datetime(p.clock_in) < datetime(?,'+1 day')
-            ORDER BY u.full_name, p.clock_in
-            """,
-            conn,
-            params=(datetime.combine(start, time.min).isoformat(), end.isoformat()),
-        )
-
-    if df.empty:
+    daily, csv = compute_report(start, end)
+    if daily.empty:
         st.caption("Ingen data i intervallet.")
         return
 
-    df["clock_in"] = pd.to_datetime(df["clock_in"]) ; df["clock_out"] = pd.to_datetime(df["clock_out"]) 
-    df["hours"] = ((df["clock_out"] - df["clock_in"]).dt.total_seconds()/3600).fillna(0).round(2)
-
-    # Enkel övertidsregel: >8h på en dag => 50% OT på överskjutande
-    df["date"] = df["clock_in"].dt.date
-    daily = df.groupby(["full_name","date"]).agg({"hours":"sum","hourly_rate":"max"}).reset_index()
-    daily["ot_hours"] = (daily["hours"] - 8).clip(lower=0)
-    daily["reg_hours"] = daily["hours"] - daily["ot_hours"]
-    daily["pay"] = daily["reg_hours"]*daily["hourly_rate"] + daily["ot_hours"]*daily["hourly_rate"]*1.5
-
     st.subheader("Summering per dag & person")
     st.dataframe(daily, use_container_width=True)
 
     # Export
-    csv = daily.to_csv(index=False).encode("utf-8")
     st.download_button("Ladda ner CSV", data=csv, file_name="rapport.csv", mime="text/csv")
 
 
@@ -471,7 +589,6 @@ def reports_view():
 
 def main():
     st.set_page_config(page_title="Tidsapp", page_icon="⏱️", layout="wide")
-    init_db()
     ensure_seed_admin()
 
     st.sidebar.title("Tidsapp")